@@ -0,0 +1,178 @@
+"""
+Local stand-ins for the network services the bot talks to (Slack, Pinecone,
+Lakera, Azure OpenAI, MongoDB), so the benchmarks run fully offline.
+
+Only the service clients are replaced. Parsing, PDF and tokenizer libraries
+(BeautifulSoup, reportlab, tiktoken) are the real ones, since those are what
+the benchmarks measure.
+"""
+import sys
+import types
+
+class FakeSlackClient:
+    def __init__(self):
+        self.calls = []
+
+    def auth_test(self):
+        return {"user_id": "UBOTFAKE"}
+
+    def reactions_add(self, channel, timestamp, name):
+        self.calls.append(("reactions_add", name))
+
+    def reactions_remove(self, channel, timestamp, name):
+        self.calls.append(("reactions_remove", name))
+
+    def emoji_list(self):
+        return {"emoji": {}}
+
+class FakeApp:
+    def __init__(self, token=None, **kwargs):
+        self.client = FakeSlackClient()
+
+    def event(self, name):
+        def decorator(func):
+            return func
+        return decorator
+
+class FakeSocketModeHandler:
+    def __init__(self, app, token):
+        pass
+
+    def start(self):
+        pass
+
+class FakeAssistant:
+    """Pinecone assistant that answers every chat with a canned reply containing mentions."""
+
+    def __init__(self, reply=None):
+        self.reply = reply or (
+            "Sprig is a Hack Club program where you build a JS game and play it on your own console! "
+            "Ask <@U0123ABCD> or post in <!channel> with @channel for help."
+        )
+        self.chats = 0
+
+    def chat(self, messages, **kwargs):
+        self.chats += 1
+        return {"message": {"role": "assistant", "content": self.reply}}
+
+    def list_files(self, filter=None):
+        return []
+
+    def upload_file(self, file_path, metadata=None):
+        return {"id": "file-fake", "status": "Available"}
+
+    def describe_file(self, file_id):
+        return {"id": file_id, "status": "Available", "percent_done": 100}
+
+    def delete_file(self, file_id):
+        pass
+
+class FakePinecone:
+    def __init__(self, api_key=None, **kwargs):
+        self.assistant = types.SimpleNamespace(Assistant=lambda assistant_name=None: FakeAssistant())
+
+class FakeMessage:
+    def __init__(self, content, role="user"):
+        self.content = content
+        self.role = role
+
+class FakeScheduler:
+    def __init__(self, *args, **kwargs):
+        self.jobs = []
+
+    def add_job(self, func, *args, **kwargs):
+        self.jobs.append(func)
+
+    def start(self):
+        pass
+
+class FakeLakeraResponse:
+    status_code = 200
+
+    def __init__(self, flagged=False):
+        self._payload = {"flagged": flagged, "metadata": {"request_uuid": "fake"}}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+def fake_lakera_post(url, json=None, headers=None, timeout=None):
+    return FakeLakeraResponse(flagged=False)
+
+class FakeEmbeddingsClient:
+    def __init__(self, dim=3072):
+        self.dim = dim
+
+    def create(self, input, model=None):
+        item = types.SimpleNamespace(embedding=[0.0] * self.dim)
+        return types.SimpleNamespace(data=[item])
+
+class FakeAzureOpenAI:
+    def __init__(self, **kwargs):
+        self.embeddings = FakeEmbeddingsClient()
+
+class FakeCursor(list):
+    def batch_size(self, n):
+        return self
+
+class FakeCollection:
+    """
+    Holds documents as encoded BSON and decodes them on every find(), like
+    documents coming off the wire from MongoDB. Queries and projections are ignored.
+    """
+
+    def __init__(self, docs=()):
+        self._raw = []
+        if docs:
+            import bson
+            self._raw = [bson.encode(doc) for doc in docs]
+
+    def find(self, *args, **kwargs):
+        if not self._raw:
+            return FakeCursor()
+        import bson
+        return FakeCursor(bson.decode(raw) for raw in self._raw)
+
+    def update_one(self, *args, **kwargs):
+        pass
+
+    def storage_size(self):
+        return sum(len(raw) for raw in self._raw)
+
+class FakeMongoClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getitem__(self, name):
+        return FakeDatabase()
+
+class FakeDatabase:
+    def __getitem__(self, name):
+        return FakeCollection()
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+def install():
+    """Register the fake service client modules in sys.modules. Safe to call more than once."""
+    modules = {
+        "slack_bolt": _module("slack_bolt", App=FakeApp),
+        "slack_bolt.adapter": _module("slack_bolt.adapter"),
+        "slack_bolt.adapter.socket_mode": _module("slack_bolt.adapter.socket_mode", SocketModeHandler=FakeSocketModeHandler),
+        "pinecone": _module("pinecone", Pinecone=FakePinecone),
+        "pinecone_plugins": _module("pinecone_plugins"),
+        "pinecone_plugins.assistant": _module("pinecone_plugins.assistant"),
+        "pinecone_plugins.assistant.models": _module("pinecone_plugins.assistant.models"),
+        "pinecone_plugins.assistant.models.chat": _module("pinecone_plugins.assistant.models.chat", Message=FakeMessage),
+        "apscheduler": _module("apscheduler"),
+        "apscheduler.schedulers": _module("apscheduler.schedulers"),
+        "apscheduler.schedulers.background": _module("apscheduler.schedulers.background", BackgroundScheduler=FakeScheduler),
+        "openai": _module("openai", AzureOpenAI=FakeAzureOpenAI),
+        "pymongo": _module("pymongo", MongoClient=FakeMongoClient),
+    }
+    for name, module in modules.items():
+        sys.modules[name] = module
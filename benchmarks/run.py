@@ -0,0 +1,563 @@
+"""
+Offline performance benchmarks with stored baselines.
+
+    python benchmarks/run.py --save        # record benchmarks/baseline.json
+    python benchmarks/run.py               # rerun and compare against it
+
+Every benchmark runs against the checked-in scrape corpus and local fakes for
+Slack, Pinecone, Lakera and Azure (see fakes.py). A benchmark is reported as a
+regression when its samples are significantly slower than the baseline's
+(one-sided Mann-Whitney U test) and the median slowed down by more than the
+threshold. The exit status is 1 if any regression was found or a benchmark
+that has a baseline entry raised.
+"""
+import os
+import io
+import sys
+import json
+import math
+import time
+import asyncio
+import logging
+import contextlib
+import platform
+import argparse
+import tempfile
+import threading
+import statistics
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CORPUS_FILE = os.path.join(ROOT, "hackclub_embeddings_cron.json")
+FIXED_CORPUS_FILE = os.path.join(ROOT, "embeddings_fixed.json")
+YSWS_FILE = os.path.join(ROOT, "ysws-data.json")
+REPEAT = 15
+ALPHA = 0.01
+THRESHOLD = 0.05
+TIKTOKEN_LOAD_TIMEOUT = 10
+
+BENCHMARKS = {}
+
+class SkipBenchmark(Exception):
+    """Raised by a setup function when a benchmark can't run in this environment."""
+
+def benchmark(name, number=1):
+    """Register a benchmark. The decorated setup function returns the callable to time."""
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, number)
+        return setup
+    return decorator
+
+def load_corpus(path=CORPUS_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def corpus_to_html(doc):
+    """Rebuild a plausible page from a scraped document for the parser benchmark."""
+    from html import escape
+    headings = "".join(f"<h2>{escape(h)}</h2>" for h in doc["metadata"].get("headings", []))
+    paragraphs = "".join(f"<p>{escape(p)}</p>" for p in doc["content"].split("\n"))
+    keywords = escape(", ".join(doc["metadata"].get("keywords", [])))
+    return (
+        f"<html><head><title>{escape(doc['title'])}</title>"
+        f'<meta name="keywords" content="{keywords}">'
+        f'<meta name="description" content="{escape(doc["title"])}"></head>'
+        f"<body><nav><a href=\"/\">Home</a></nav>{headings}{paragraphs}</body></html>"
+    )
+
+class FakeResponse:
+    content_type = "text/html"
+
+    def __init__(self, html, status=200):
+        self.status = status
+        self._html = html
+
+    async def text(self):
+        return self._html
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeSession:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, **kwargs):
+        return FakeResponse(self.pages[url])
+
+class FixtureServer:
+    """
+    Local HTTP server for the crawler benchmarks, run on a background thread.
+
+    `/s/<n>` redirects to `/page/<n>` the way hack.af does. Each page links to
+    the next `links_per_page` pages and to `shortlinks_per_page` shortlinks, so
+    a crawl from `/page/0` reaches every page over several batches, the way the
+    real crawl fans out across a club's site. Each response is delayed by
+    `latency` seconds to stand in for a round trip to a real host.
+    """
+
+    def __init__(self, pages=200, links_per_page=20, shortlinks_per_page=5, latency=0.005):
+        from aiohttp import web
+        self.pages = pages
+        self.links_per_page = links_per_page
+        self.shortlinks_per_page = shortlinks_per_page
+        self.latency = latency
+
+        app = web.Application()
+        app.router.add_route("*", "/s/{n}", self.shortlink)
+        app.router.add_route("*", "/page/{n}", self.page)
+        self.loop = asyncio.new_event_loop()
+        self.runner = web.AppRunner(app, access_log=None)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.port = self.runner.addresses[0][1]
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    @property
+    def shortlink_host(self):
+        return f"127.0.0.1:{self.port}"
+
+    @property
+    def page_host(self):
+        # Pages go through name resolution, shortlinks don't
+        return f"localhost:{self.port}"
+
+    async def shortlink(self, request):
+        from aiohttp import web
+        await asyncio.sleep(self.latency)
+        raise web.HTTPFound(f"http://{self.page_host}/page/{request.match_info['n']}")
+
+    async def page(self, request):
+        from aiohttp import web
+        await asyncio.sleep(self.latency)
+        n = int(request.match_info["n"])
+        links = "".join(
+            f'<a href="/page/{(n + i) % self.pages}">Page {i}</a>' for i in range(1, self.links_per_page + 1)
+        )
+        links += "".join(
+            f'<a href="http://{self.shortlink_host}/s/{(n + i * 7) % self.pages}">Short {i}</a>'
+            for i in range(1, self.shortlinks_per_page + 1)
+        )
+        html = (
+            f"<html><head><title>Page {n}</title></head><body><h1>Page {n}</h1>"
+            f"<p>Fixture page {n} for the crawler benchmark.</p>{links}</body></html>"
+        )
+        return web.Response(text=html, content_type="text/html")
+
+_fixture_server = None
+
+def fixture_server():
+    global _fixture_server
+    if _fixture_server is None:
+        _fixture_server = FixtureServer()
+    return _fixture_server
+
+def offline_scrape(server):
+    """Import scrape pointed at the fixture server, without tldextract fetching the suffix list."""
+    import types
+    import tldextract
+    import scrape
+    scrape.SHORTLINK_DOMAIN = server.shortlink_host
+    scrape.tldextract = types.SimpleNamespace(extract=tldextract.TLDExtract(suffix_list_urls=()))
+    return scrape
+
+def import_slack_bot():
+    fakes.install()
+    import slack_bot
+    # The bot configures DEBUG logging on import; keep benchmark output readable
+    logging.getLogger().setLevel(logging.WARNING)
+    # Keep the handler's query log out of the working tree
+    slack_bot.query_logger.path = os.path.join(tempfile.mkdtemp(prefix="bench-query-log-"), "query_log.jsonl")
+    # The bot loads hackclub_bm25.idx from the working directory if one was built;
+    # pin the index and the hint flag so every run times the same code path
+    import bm25_index
+    slack_bot.keyword_index = bm25_index.BM25Index.build(load_corpus())
+    slack_bot.KEYWORD_HINTS_ENABLED = False
+    return slack_bot
+
+@benchmark("scrape.extract_data", number=1)
+def bench_extract_data():
+    import scrape
+    docs = load_corpus()[:100]
+    pages = {doc["url"]: corpus_to_html(doc) for doc in docs}
+    session = FakeSession(pages)
+
+    async def run():
+        await asyncio.gather(*(scrape.extract_data(session, url) for url in pages))
+
+    def go():
+        asyncio.run(run())
+    return go
+
+@benchmark("scrape.expand_shortlinks.cold", number=1)
+def bench_expand_shortlinks_cold():
+    server = fixture_server()
+    scrape = offline_scrape(server)
+    urls = [f"http://{server.shortlink_host}/s/{n}" for n in range(200)]
+
+    async def run():
+        scrape.shortlink_cache.clear()
+        async with scrape.aiohttp.ClientSession(connector=scrape.make_connector()) as session:
+            await scrape.preresolve_shortlinks(session, urls)
+
+    def go():
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+    return go
+
+@benchmark("scrape.expand_shortlinks.cached", number=10)
+def bench_expand_shortlinks_cached():
+    server = fixture_server()
+    scrape = offline_scrape(server)
+    urls = [f"http://{server.shortlink_host}/s/{n}" for n in range(200)]
+
+    async def run():
+        async with scrape.aiohttp.ClientSession(connector=scrape.make_connector()) as session:
+            await scrape.preresolve_shortlinks(session, urls)
+            await asyncio.gather(*(scrape.expand_shortlink(session, url) for url in urls))
+
+    def go():
+        asyncio.run(run())
+    return go
+
+def slow_resolver(latency=0.02):
+    """
+    Resolver that adds `latency` seconds to every lookup. localhost resolves
+    from /etc/hosts with no DNS traffic, so this stands in for a real lookup.
+    """
+    from aiohttp.abc import AbstractResolver
+    from aiohttp.resolver import ThreadedResolver
+
+    class SlowResolver(AbstractResolver):
+        def __init__(self):
+            self.resolver = ThreadedResolver()
+            self.lookups = 0
+
+        async def resolve(self, host, port=0, family=0):
+            self.lookups += 1
+            await asyncio.sleep(latency)
+            return await self.resolver.resolve(host, port, family)
+
+        async def close(self):
+            await self.resolver.close()
+
+    return SlowResolver()
+
+def crawl_fixture(scrape, server, connector_factory):
+    start_urls = [f"http://{server.page_host}/page/0"]
+
+    async def run():
+        scrape.visited_urls.clear()
+        scrape.collected_data.clear()
+        scrape.shortlink_cache.clear()
+        # tldextract finds no registered domain for localhost or an IP address
+        scrape.allowed_domains = {""}
+        async with scrape.aiohttp.ClientSession(connector=connector_factory()) as session:
+            await scrape.crawl(session, start_urls)
+        if len(scrape.collected_data) != server.pages:
+            raise RuntimeError(f"Crawl collected {len(scrape.collected_data)} of {server.pages} fixture pages")
+
+    def go():
+        # The crawler prints a line per page
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+    return go
+
+@benchmark("scrape.crawl", number=1)
+def bench_crawl():
+    server = fixture_server()
+    scrape = offline_scrape(server)
+    return crawl_fixture(scrape, server, lambda: scrape.make_connector(resolver=slow_resolver()))
+
+@benchmark("scrape.crawl.no_reuse", number=1)
+def bench_crawl_no_reuse():
+    # Reference point: same limits, but a fresh connection and DNS lookup for every request
+    server = fixture_server()
+    scrape = offline_scrape(server)
+
+    def connector():
+        return scrape.aiohttp.TCPConnector(
+            resolver=slow_resolver(),
+            limit=scrape.MAX_CONCURRENT_REQUESTS,
+            limit_per_host=scrape.MAX_REQUESTS_PER_HOST,
+            force_close=True,
+            use_dns_cache=False,
+            ssl=False
+        )
+    return crawl_fixture(scrape, server, connector)
+
+@benchmark("slack_bot.yaml_to_pdf", number=1)
+def bench_yaml_to_pdf():
+    slack_bot = import_slack_bot()
+    with open(YSWS_FILE, "r", encoding="utf-8") as f:
+        # The checked-in snapshot wraps the catalog's sections in a single top-level key
+        data = json.load(f)["hack club latest ysws data"]
+    out_dir = tempfile.mkdtemp(prefix="bench-pdf-")
+    path = os.path.join(out_dir, "ysws-data.pdf")
+
+    def go():
+        slack_bot.yaml_to_pdf(data, path)
+    return go
+
+@benchmark("embeddings.truncate_text", number=1)
+def bench_truncate_text():
+    import tiktoken
+    # tiktoken downloads the encoding on first use (with no timeout), so load it
+    # in a daemon thread and skip if that fails or doesn't finish promptly
+    loaded = {}
+
+    def load():
+        try:
+            loaded["encoding"] = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            loaded["error"] = e
+
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    thread.join(TIKTOKEN_LOAD_TIMEOUT)
+    if "encoding" not in loaded:
+        reason = loaded.get("error") or f"timed out after {TIKTOKEN_LOAD_TIMEOUT}s"
+        raise SkipBenchmark(
+            f"could not load the cl100k_base tiktoken encoding ({reason}); run once with network "
+            f"access or set TIKTOKEN_CACHE_DIR to a directory holding it"
+        )
+    fakes.install()
+    import embeddings
+    texts = [doc["content"] for doc in load_corpus()]
+    # Include a few documents that actually exceed the limit
+    texts += ["\n".join(texts[:200])] * 3
+
+    def go():
+        for text in texts:
+            embeddings.truncate_text(text, max_tokens=8192)
+    return go
+
+@benchmark("slack_bot.sanitize_mentions", number=5)
+def bench_sanitize_mentions():
+    slack_bot = import_slack_bot()
+    texts = [doc["content"] + " <@U0123ABCD> ping <!channel> @here" for doc in load_corpus()]
+
+    def go():
+        for text in texts:
+            slack_bot.sanitize_mentions(text)
+    return go
+
+@benchmark("slack_bot.handle_app_mention_events", number=20)
+def bench_mention_handler():
+    slack_bot = import_slack_bot()
+    os.environ.setdefault("LAKERA_GUARD_API_KEY", "fake-key")
+    # Route the Lakera Guard call to the local fake
+    slack_bot.requests.post = fakes.fake_lakera_post
+    body = {
+        "event": {
+            "channel": "CBENCHMARK",
+            "ts": "1700000000.000100",
+            "text": "<@UBOTFAKE> what is sprig and how do I get a console?",
+        }
+    }
+    replies = []
+
+    def go():
+        slack_bot.handle_app_mention_events(body, replies.append)
+        replies.clear()
+    return go
+
+def embedding_collection(storage_format, count=400, dim=3072):
+    import numpy as np
+    import embedding_storage
+    vectors = np.random.default_rng(0).standard_normal((count, dim), dtype=np.float32)
+    docs = [
+        dict(_id=i, **embedding_storage.pack_embedding(vector, storage_format, model="text-embedding-3-large"))
+        for i, vector in enumerate(vectors)
+    ]
+    return fakes.FakeCollection(docs)
+
+def bench_load_embedding_matrix(storage_format):
+    def setup():
+        import embedding_storage
+        collection = embedding_collection(storage_format)
+
+        def go():
+            embedding_storage.load_embedding_matrix(collection)
+        return go
+    return setup
+
+for _storage_format in ("list", "float32", "float16", "int8"):
+    benchmark(f"embedding_storage.load_embedding_matrix.{_storage_format}", number=1)(
+        bench_load_embedding_matrix(_storage_format)
+    )
+
+@benchmark("fix_json.convert_stream", number=1)
+def bench_fix_json():
+    import fix_json
+    with open(CORPUS_FILE, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    def go():
+        fix_json.convert_stream(io.StringIO(text), io.StringIO(), "jsonl")
+    return go
+
+@benchmark("bm25_index.update", number=1)
+def bench_bm25_update():
+    import bm25_index
+    old_docs = load_corpus(FIXED_CORPUS_FILE)
+    new_docs = load_corpus()
+
+    def go():
+        index = bm25_index.BM25Index.build(old_docs)
+        index.update(new_docs)
+    return go
+
+@benchmark("bm25_index.search", number=200)
+def bench_bm25_search():
+    import bm25_index
+    index = bm25_index.BM25Index.build(load_corpus())
+    queries = ["angelhacks toronto", "sprig", "hack club arcade hours", "onboard pcb grant"]
+
+    def go():
+        for query in queries:
+            index.search(query)
+    return go
+
+def run_benchmark(name, repeat=REPEAT):
+    """Return per-call timings in seconds for one benchmark, one sample per repeat."""
+    setup, number = BENCHMARKS[name]
+    func = setup()
+    func()  # Warm up caches and lazy imports
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+def mann_whitney_greater(current, baseline):
+    """
+    One-sided Mann-Whitney U test that `current` tends to be larger than
+    `baseline`, using the normal approximation with tie correction.
+    Returns the p-value.
+    """
+    n1, n2 = len(current), len(baseline)
+    if not n1 or not n2:
+        return 1.0
+    combined = sorted([(v, 0) for v in current] + [(v, 1) for v in baseline])
+    ranks = [0.0] * len(combined)
+    tie_term = 0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        t = j - i + 1
+        tie_term += t ** 3 - t
+        i = j + 1
+    r1 = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u1 = r1 - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u1 - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 1 - statistics.NormalDist().cdf(z)
+
+def compare(results, baseline, alpha=ALPHA, threshold=THRESHOLD):
+    """Return a list of (name, ratio, p_value, regressed) for benchmarks present in both runs."""
+    rows = []
+    for name, entry in results.items():
+        if name not in baseline.get("benchmarks", {}):
+            continue
+        base = baseline["benchmarks"][name]["samples"]
+        ratio = statistics.median(entry["samples"]) / statistics.median(base)
+        p_value = mann_whitney_greater(entry["samples"], base)
+        rows.append((name, ratio, p_value, p_value < alpha and ratio > 1 + threshold))
+    return rows
+
+def format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite and compare against a stored baseline.")
+    parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Samples per benchmark")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Path to the baseline file")
+    parser.add_argument("--save", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="Significance level for regressions")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Minimum relative median slowdown to report (0.05 = 5%%)")
+    args = parser.parse_args()
+
+    results = {}
+    failed = []
+    for name in BENCHMARKS:
+        if args.filter not in name:
+            continue
+        try:
+            samples = run_benchmark(name, args.repeat)
+        except (ImportError, SkipBenchmark) as e:
+            print(f"{name:50} skipped ({e})")
+            continue
+        except Exception as e:
+            print(f"{name:50} failed ({type(e).__name__}: {e})")
+            failed.append(name)
+            continue
+        results[name] = {"samples": samples, "median": statistics.median(samples)}
+        print(f"{name:50} {format_seconds(results[name]['median']):>12}  (median of {len(samples)})")
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    # A benchmark that used to run and now raises could be hiding a regression
+    broken = [name for name in failed if baseline and name in baseline.get("benchmarks", {})]
+
+    if args.save:
+        # Keep entries for benchmarks that were filtered out or skipped this run
+        baseline = baseline or {"benchmarks": {}}
+        baseline["benchmarks"].update(results)
+        baseline["python"] = platform.python_version()
+        baseline["platform"] = platform.platform()
+        baseline["recorded_at"] = datetime.utcnow().isoformat()
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Baseline written to: {args.baseline}")
+        if broken:
+            print(f"\n{len(broken)} benchmark(s) with a baseline failed: {', '.join(broken)}")
+            sys.exit(1)
+        return
+
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; rerun with --save to record one")
+        return
+
+    print(f"\nCompared with baseline from {baseline.get('recorded_at', 'unknown')} (Python {baseline.get('python', '?')}):")
+    regressions = 0
+    for name, ratio, p_value, regressed in compare(results, baseline, args.alpha, args.threshold):
+        flag = "REGRESSION" if regressed else ""
+        regressions += regressed
+        print(f"{name:50} {ratio:6.2f}x  p={p_value:.4f}  {flag}")
+    for name in broken:
+        print(f"{name:50} FAILED")
+    if regressions:
+        print(f"\n{regressions} significant slowdown(s) detected")
+    if broken:
+        print(f"\n{len(broken)} benchmark(s) with a baseline failed: {', '.join(broken)}")
+    if regressions or broken:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
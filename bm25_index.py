@@ -0,0 +1,307 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import heapq
+import hashlib
+import argparse
+from array import array
+from collections import Counter
+
+# Configuration
+INDEX_FILE = "hackclub_bm25.idx"
+EMBEDDINGS_FILE = "hackclub_embeddings_cron.json"
+K1 = 1.2
+B = 0.75
+RRF_K = 60
+
+MAGIC = b"OBM25\x01"
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or "
+    "that the this to was what when where which who why will with you your".split()
+)
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens with a small stopword list removed."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+def document_text(doc):
+    """The fields of a scraped page that get indexed: title, content and headings."""
+    headings = (doc.get("metadata") or {}).get("headings") or []
+    return "\n".join([doc.get("title") or "", doc.get("content") or ""] + headings)
+
+def document_key(doc):
+    # The scraper assigns a fresh uuid to every page on every run, so the URL
+    # is the only identity that survives between scrapes
+    return doc.get("url") or doc["id"]
+
+def document_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class BM25Index:
+    """
+    Inverted index with array-backed postings for BM25 keyword search.
+
+    Postings for a term are a contiguous slice of `doc_ids`/`tfs`, located via
+    `vocab[term] = (offset, length)`. IDF and document lengths are
+    precomputed so a query only walks the postings of its own terms.
+    """
+
+    def __init__(self, k1=K1, b=B):
+        self.k1 = k1
+        self.b = b
+        self.docs = []           # [{"key", "url", "title", "hash"}] by doc id
+        self.vocab = {}          # term -> (offset, length)
+        self.doc_ids = array("I")
+        self.tfs = array("I")
+        self.doc_lengths = array("I")
+        self.idf = {}            # term -> idf
+        self._norms = array("d")
+
+    def __len__(self):
+        return len(self.docs)
+
+    @classmethod
+    def build(cls, documents, k1=K1, b=B):
+        index = cls(k1=k1, b=b)
+        index.update(documents)
+        return index
+
+    def update(self, documents):
+        """
+        Bring the index in line with a new scrape.
+
+        Only pages whose indexed text changed (or that are new) are tokenized;
+        postings for unchanged pages are carried over from the current index
+        and pages missing from `documents` are dropped. Returns a dict of
+        added/changed/removed/unchanged counts.
+        """
+        old_by_key = {d["key"]: (i, d["hash"]) for i, d in enumerate(self.docs)}
+        new_docs = []
+        remap = {}          # old doc id -> new doc id for carried-over pages
+        fresh = {}          # new doc id -> Counter of term frequencies
+        lengths = array("I")
+        seen = set()
+        stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+
+        for doc in documents:
+            key = document_key(doc)
+            if key in seen:
+                continue
+            seen.add(key)
+            text = document_text(doc)
+            digest = document_hash(text)
+            doc_id = len(new_docs)
+            new_docs.append({"key": key, "url": doc.get("url"), "title": doc.get("title"), "hash": digest})
+
+            old = old_by_key.get(key)
+            if old and old[1] == digest:
+                remap[old[0]] = doc_id
+                lengths.append(self.doc_lengths[old[0]])
+                stats["unchanged"] += 1
+            else:
+                tokens = tokenize(text)
+                fresh[doc_id] = Counter(tokens)
+                lengths.append(len(tokens))
+                stats["changed" if old else "added"] += 1
+        stats["removed"] = len(old_by_key) - stats["unchanged"] - stats["changed"]
+
+        # Merge carried-over postings with postings of re-tokenized pages
+        merged = {}
+        for term, (offset, length) in self.vocab.items():
+            kept = []
+            for i in range(offset, offset + length):
+                new_id = remap.get(self.doc_ids[i])
+                if new_id is not None:
+                    kept.append((new_id, self.tfs[i]))
+            if kept:
+                merged[term] = kept
+        for doc_id, counts in fresh.items():
+            for term, tf in counts.items():
+                merged.setdefault(term, []).append((doc_id, tf))
+
+        vocab = {}
+        doc_ids = array("I")
+        tfs = array("I")
+        for term in sorted(merged):
+            postings = sorted(merged[term])
+            vocab[term] = (len(doc_ids), len(postings))
+            doc_ids.extend(p[0] for p in postings)
+            tfs.extend(p[1] for p in postings)
+
+        self.docs = new_docs
+        self.vocab = vocab
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = lengths
+        self._precompute()
+        return stats
+
+    def _precompute(self):
+        n = len(self.docs)
+        self.idf = {
+            term: math.log(1 + (n - length + 0.5) / (length + 0.5))
+            for term, (_, length) in self.vocab.items()
+        }
+        avgdl = (sum(self.doc_lengths) / n) if n else 0.0
+        # Per-document length normalisation term of the BM25 denominator
+        if avgdl:
+            self._norms = array("d", (self.k1 * (1 - self.b + self.b * dl / avgdl) for dl in self.doc_lengths))
+        else:
+            self._norms = array("d", (self.k1 for _ in self.doc_lengths))
+
+    def search(self, query, top_k=5):
+        """Return up to top_k (score, doc) pairs for query, best first."""
+        scores = {}
+        k1 = self.k1 + 1
+        doc_ids, tfs, norms = self.doc_ids, self.tfs, self._norms
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            offset, length = entry
+            idf = self.idf[term]
+            for i in range(offset, offset + length):
+                doc_id = doc_ids[i]
+                tf = tfs[i]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * k1 / (tf + norms[doc_id])
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, self.docs[doc_id]) for doc_id, score in best]
+
+    def save(self, path=INDEX_FILE):
+        header = json.dumps({
+            "k1": self.k1,
+            "b": self.b,
+            "docs": self.docs,
+            "vocab": self.vocab,
+            "itemsize": self.doc_ids.itemsize,
+        }, ensure_ascii=False).encode("utf-8")
+        # Write next to the index and swap it in, so a crash never leaves a truncated file
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(MAGIC)
+                f.write(len(header).to_bytes(8, "little"))
+                f.write(header)
+                for arr in (self.doc_lengths, self.doc_ids, self.tfs):
+                    f.write(len(arr).to_bytes(8, "little"))
+                    arr.tofile(f)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path=INDEX_FILE):
+        """Load an index written by save(). Raises ValueError if the file is not a complete index."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a BM25 index file")
+            try:
+                header = json.loads(_read_exact(f, _read_length(f)))
+                index = cls(k1=header["k1"], b=header["b"])
+                itemsize = header["itemsize"]
+                index.docs = header["docs"]
+                index.vocab = {term: tuple(entry) for term, entry in header["vocab"].items()}
+            except (EOFError, KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"{path} is truncated or corrupt: {e}") from e
+            if itemsize != index.doc_ids.itemsize:
+                raise ValueError(f"{path} was written on a platform with a different array item size")
+            try:
+                for arr in (index.doc_lengths, index.doc_ids, index.tfs):
+                    arr.fromfile(f, _read_length(f))
+            except (EOFError, ValueError) as e:
+                raise ValueError(f"{path} is truncated or corrupt: {e}") from e
+            if (f.read(1) or len(index.doc_lengths) != len(index.docs) or
+                    len(index.doc_ids) != len(index.tfs)):
+                raise ValueError(f"{path} is truncated or corrupt")
+        index._precompute()
+        return index
+
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise EOFError(f"expected {size} bytes, got {len(data)}")
+    return data
+
+def _read_length(f):
+    return int.from_bytes(_read_exact(f, 8), "little")
+
+def reciprocal_rank_fusion(*rankings, k=RRF_K, top_k=None):
+    """
+    Fuse several ranked lists of keys (e.g. BM25 URLs and vector search URLs)
+    with reciprocal rank fusion. Returns (score, key) pairs, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(((score, key) for key, score in scores.items()), key=lambda item: -item[0])
+    return fused[:top_k] if top_k else fused
+
+def hybrid_search(index, query, vector_keys, top_k=5, k=RRF_K):
+    """Fuse BM25 results for query with an already ranked list of vector search keys."""
+    bm25_keys = [doc["key"] for _, doc in index.search(query, top_k=max(top_k, len(vector_keys)))]
+    return reciprocal_rank_fusion(bm25_keys, vector_keys, k=k, top_k=top_k)
+
+def load_documents(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def update_index_file(documents_path=EMBEDDINGS_FILE, index_path=INDEX_FILE):
+    """Update the on-disk index from a scrape, creating it if needed. Returns (index, stats)."""
+    try:
+        index = BM25Index.load(index_path)
+    except FileNotFoundError:
+        index = BM25Index()
+    except ValueError as e:
+        # A corrupt index is rebuilt from scratch like a missing one
+        print(f"Rebuilding index: {e}", file=sys.stderr)
+        index = BM25Index()
+    stats = index.update(load_documents(documents_path))
+    index.save(index_path)
+    return index, stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the BM25 keyword index over the scraped corpus.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Create or incrementally update the index from a scrape")
+    build_parser.add_argument("input", nargs="?", default=EMBEDDINGS_FILE, help="Scraped JSON array")
+    build_parser.add_argument("--index", default=INDEX_FILE, help="Path to the index file")
+
+    search_parser = subparsers.add_parser("search", help="Run a BM25 query against the index")
+    search_parser.add_argument("query", help="Query text")
+    search_parser.add_argument("--index", default=INDEX_FILE, help="Path to the index file")
+    search_parser.add_argument("-k", "--top-k", type=int, default=5, help="Number of results")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index, stats = update_index_file(args.input, args.index)
+        elapsed = time.perf_counter() - start
+        print(f"Indexed {len(index)} documents, {len(index.vocab)} terms in {elapsed:.2f}s "
+              f"(added {stats['added']}, changed {stats['changed']}, removed {stats['removed']}, "
+              f"unchanged {stats['unchanged']})")
+    else:
+        try:
+            index = BM25Index.load(args.index)
+        except FileNotFoundError:
+            print(f"Index {args.index} not found, run the build command first")
+            sys.exit(1)
+        except ValueError as e:
+            print(f"{e}, rerun the build command")
+            sys.exit(1)
+        start = time.perf_counter()
+        results = index.search(args.query, top_k=args.top_k)
+        elapsed = time.perf_counter() - start
+        for score, doc in results:
+            print(f"{score:7.3f}  {doc['title']}  {doc['url']}")
+        print(f"{len(results)} results in {elapsed * 1000:.3f} ms")
+
+if __name__ == "__main__":
+    main()
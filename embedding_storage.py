@@ -0,0 +1,118 @@
+import numpy as np
+from bson.binary import Binary
+
+# Storage formats for the "embedding" field. "list" is the original BSON array
+# of doubles; the others pack the vector into a single BSON binary value.
+STORAGE_FORMATS = ("list", "float32", "float16", "int8")
+EMBEDDING_FIELD = "embedding"
+META_FIELD = "embedding_meta"
+
+def pack_embedding(vector, storage_format="float32", model=None):
+    """
+    Encode an embedding for storage. Returns the fields to $set on the document:
+    the embedding itself and, for binary formats, its model/dim/dtype/scale metadata.
+
+    int8 uses symmetric per-vector quantization: value ~= int8 * scale.
+    """
+    if storage_format == "list":
+        return {EMBEDDING_FIELD: [float(v) for v in vector]}
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown embedding storage format: {storage_format}")
+
+    arr = np.asarray(vector, dtype=np.float32)
+    meta = {"model": model, "dim": int(arr.shape[0]), "dtype": storage_format}
+    if storage_format == "int8":
+        peak = float(np.abs(arr).max()) if arr.size else 0.0
+        scale = peak / 127 if peak else 1.0
+        arr = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+        meta["scale"] = scale
+    elif storage_format == "float16":
+        arr = arr.astype(np.float16)
+
+    # Fix the byte order so documents read the same on any platform
+    arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+    return {EMBEDDING_FIELD: Binary(arr.tobytes()), META_FIELD: meta}
+
+def unpack_embedding(doc):
+    """Decode a document's embedding (either format) into a float32 NumPy vector."""
+    value = doc[EMBEDDING_FIELD]
+    if isinstance(value, list):
+        return np.asarray(value, dtype=np.float32)
+    meta = doc[META_FIELD]
+    arr = np.frombuffer(value, dtype=np.dtype(meta["dtype"]).newbyteorder("<"))
+    if meta["dtype"] == "int8":
+        return arr.astype(np.float32) * np.float32(meta["scale"])
+    return arr.astype(np.float32)
+
+def load_embedding_matrix(collection, query=None, batch_size=1000):
+    """
+    Load every stored embedding in a collection into one (n, dim) float32 matrix.
+
+    Binary vectors are concatenated and viewed with np.frombuffer, so decoding is
+    a single vectorised conversion rather than one Python float per element.
+    When every vector is float32 the concatenated bytes are returned as the
+    matrix without a further copy; mixed, quantized and list-format documents
+    are converted into a preallocated matrix. Returns (ids, matrix) with ids
+    in row order.
+    """
+    query = dict(query or {})
+    query.setdefault(EMBEDDING_FIELD, {"$exists": True})
+    cursor = collection.find(query, {EMBEDDING_FIELD: 1, META_FIELD: 1}).batch_size(batch_size)
+
+    ids = []
+    groups = {}   # dtype -> list of (row, bytes, scale)
+    lists = []    # (row, list of floats)
+    dim = None
+    for doc in cursor:
+        row = len(ids)
+        ids.append(doc["_id"])
+        value = doc[EMBEDDING_FIELD]
+        if isinstance(value, list):
+            lists.append((row, value))
+            doc_dim = len(value)
+        else:
+            meta = doc[META_FIELD]
+            groups.setdefault(meta["dtype"], []).append((row, value, meta.get("scale", 1.0)))
+            doc_dim = meta["dim"]
+        if dim is None:
+            dim = doc_dim
+        elif doc_dim != dim:
+            raise ValueError(f"Embedding {doc['_id']} has dimension {doc_dim}, expected {dim}")
+
+    # All float32: the joined bytes already are the matrix, so view them as-is
+    # (a bytearray, so the result is writable like the other paths)
+    if not lists and list(groups) == ["float32"]:
+        blob = bytearray().join(blob for _, blob, _ in groups["float32"])
+        matrix = np.frombuffer(blob, dtype=np.dtype("<f4")).reshape(len(ids), dim)
+        return ids, matrix.astype(np.float32, copy=False)
+
+    matrix = np.empty((len(ids), dim or 0), dtype=np.float32)
+    for dtype, entries in groups.items():
+        rows = np.fromiter((row for row, _, _ in entries), dtype=np.intp, count=len(entries))
+        block = np.frombuffer(b"".join(blob for _, blob, _ in entries), dtype=np.dtype(dtype).newbyteorder("<"))
+        block = block.reshape(len(entries), dim)
+        if dtype == "int8":
+            scales = np.fromiter((scale for _, _, scale in entries), dtype=np.float32, count=len(entries))
+            matrix[rows] = block * scales[:, None]
+        else:
+            matrix[rows] = block
+    for row, value in lists:
+        matrix[row] = value
+    return ids, matrix
+
+def migrate_embeddings(collection, storage_format, model=None, batch_size=500):
+    """Rewrite list-format embeddings in a collection into storage_format. Returns the number converted."""
+    from pymongo import UpdateOne
+    if storage_format == "list":
+        raise ValueError("Migration only converts into a binary format")
+    cursor = collection.find({EMBEDDING_FIELD: {"$type": "array"}}, {EMBEDDING_FIELD: 1})
+    updates = []
+    converted = 0
+    for doc in cursor:
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": pack_embedding(doc[EMBEDDING_FIELD], storage_format, model)}))
+        if len(updates) >= batch_size:
+            converted += collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        converted += collection.bulk_write(updates, ordered=False).modified_count
+    return converted
@@ -1,14 +1,17 @@
 import os
+import argparse
 from openai import AzureOpenAI
 from pymongo import MongoClient
 import numpy as np
 from tqdm import tqdm
 import tiktoken  # Make sure you have this installed: pip install tiktoken
+from embedding_storage import STORAGE_FORMATS, pack_embedding, migrate_embeddings
 
 # Azure OpenAI Config
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 API_VERSION = "2024-06-01"
+EMBEDDING_MODEL = "text-embedding-3-large"
 
 # Initialize Azure OpenAI Client
 azure_client = AzureOpenAI(
@@ -23,6 +26,10 @@ MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = "orpheus-bot"
 COLLECTION_NAME = "Embeddings"
 
+# How vectors are stored: "list" (BSON array of doubles) or packed BSON binary
+# ("float32", "float16" or "int8"), see embedding_storage.py
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "list")
+
 # Initialize MongoDB Connection
 mongo_client = MongoClient(MONGO_URI)
 db = mongo_client[DB_NAME]
@@ -45,27 +52,43 @@ def truncate_text(text, max_tokens=8192):
 def generate_embedding(text):
     response = azure_client.embeddings.create(
         input=text,
-        model="text-embedding-3-large"
+        model=EMBEDDING_MODEL
     )
     return response.data[0].embedding
 
 # Process Each Document
-for doc in tqdm(collection.find()):
-    if "embedding" in doc:
-        continue  # Skip if embedding already exists
+def main():
+    parser = argparse.ArgumentParser(description="Generate embeddings for documents in MongoDB.")
+    parser.add_argument("--storage", choices=STORAGE_FORMATS, default=EMBEDDING_STORAGE,
+                        help="How to store new embeddings (default from EMBEDDING_STORAGE)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Convert existing list embeddings to the --storage format and exit")
+    args = parser.parse_args()
 
-    text = doc.get("content", "")
-    if not text:
-        continue
+    if args.migrate:
+        converted = migrate_embeddings(collection, args.storage, model=EMBEDDING_MODEL)
+        print(f"Converted {converted} embeddings to {args.storage}")
+        return
 
-    # Truncate text to ensure it does not exceed the model's maximum context length
-    text = truncate_text(text, max_tokens=8192)
+    for doc in tqdm(collection.find()):
+        if "embedding" in doc:
+            continue  # Skip if embedding already exists
 
-    embedding = generate_embedding(text)
+        text = doc.get("content", "")
+        if not text:
+            continue
 
-    collection.update_one(
-        {"_id": doc["_id"]},
-        {"$set": {"embedding": embedding}}
-    )
+        # Truncate text to ensure it does not exceed the model's maximum context length
+        text = truncate_text(text, max_tokens=8192)
+
+        embedding = generate_embedding(text)
+
+        collection.update_one(
+            {"_id": doc["_id"]},
+            {"$set": pack_embedding(embedding, args.storage, model=EMBEDDING_MODEL)}
+        )
+
+    print("Embeddings generated and stored successfully!")
 
-print("Embeddings generated and stored successfully!")
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,247 @@
 import json
-import re
+import os
 import sys
+import time
 import argparse
+import tempfile
+import tracemalloc
 
-def fix_json_file(input_filename, output_filename):
-    # Read the entire file content
-    with open(input_filename, 'r', encoding='utf-8') as f:
-        data = f.read().strip()
+# Number of characters read from the input per refill of the decode buffer
+CHUNK_SIZE = 1 << 20
+# Largest single top-level value accepted, in characters
+MAX_VALUE_SIZE = 64 << 20
+OUTPUT_FORMATS = ("array", "jsonl")
 
-    # Insert commas between JSON objects.
-    # This assumes that each top-level object ends with '}' and the next one starts with '{'
-    # (even if there are newlines or spaces between).
-    fixed_data = re.sub(r'}\s*{', '},\n{', data)
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+# Errors this close to the end of the buffer may just be a value cut off mid-token
+_TRUNCATION_MARGIN = 16
 
-    # Wrap the entire string in [ ... ] to form a JSON array.
-    fixed_data = f'[{fixed_data}]'
+def _absolute_error(e, offset, line_offset, column_offset):
+    """Move a decode error's position from the sliding buffer to the whole input."""
+    if e.lineno == 1:
+        e.colno += column_offset
+    e.lineno += line_offset
+    e.pos += offset
+    e.args = (f"{e.msg}: line {e.lineno} column {e.colno} (char {e.pos})",)
+    return e
 
-    # Test if the new JSON is valid.
+def iter_json_objects(f, chunk_size=CHUNK_SIZE, max_value_size=MAX_VALUE_SIZE):
+    """
+    Incrementally decode top-level JSON values from a text stream.
+
+    Accepts all of the formats the scraper has produced: objects concatenated
+    back to back (`}{` with or without whitespace), JSON Lines, and a single
+    JSON array. Only the value currently being decoded plus one chunk is kept
+    in memory, so multi-GB dumps convert in bounded memory. A value longer than
+    `max_value_size` characters is rejected.
+    """
+    buf = ""
+    pos = 0
+    # Position of buf[0] in the input, so errors can report where they are in the file
+    offset = 0
+    line_offset = 0
+    column_offset = 0
+    eof = False
+    in_array = None  # Unknown until we see the first non-whitespace character
+
+    def fill(min_size=0):
+        nonlocal buf, pos, offset, line_offset, column_offset, eof
+        # Drop already-consumed text before growing the buffer
+        if pos:
+            newlines = buf.count("\n", 0, pos)
+            if newlines:
+                line_offset += newlines
+                column_offset = pos - buf.rfind("\n", 0, pos) - 1
+            else:
+                column_offset += pos
+            buf = buf[pos:]
+            offset += pos
+            pos = 0
+        # Read at least as much as we already hold so an oversized value is
+        # retried a logarithmic number of times rather than once per chunk
+        chunk = f.read(max(chunk_size, min_size))
+        if chunk:
+            buf += chunk
+        else:
+            eof = True
+
+    while True:
+        # Skip whitespace (and commas between array elements)
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            fill()
+
+        if pos >= len(buf):
+            if in_array:
+                raise ValueError("Unexpected end of input: unterminated JSON array")
+            return
+
+        if in_array is None:
+            in_array = buf[pos] == "["
+            if in_array:
+                pos += 1
+                continue
+
+        if in_array:
+            if buf[pos] == "]":
+                pos += 1
+                in_array = False
+                continue
+            if buf[pos] == ",":
+                pos += 1
+                continue
+
+        try:
+            obj, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            # Only an error at the very end of the buffer (or inside a string
+            # that runs to it) can be fixed by reading more; anything earlier
+            # is a real syntax error and is reported without buffering further
+            truncated = e.pos >= len(buf) - _TRUNCATION_MARGIN or e.msg.startswith("Unterminated string")
+            if eof or not truncated:
+                raise _absolute_error(e, offset, line_offset, column_offset)
+            if len(buf) - pos > max_value_size:
+                raise ValueError(f"JSON value at offset {offset + pos} exceeds {max_value_size} characters")
+            fill(len(buf) - pos)
+            continue
+
+        # A number that runs up to the buffer edge (or stops at a '.', 'e' or
+        # sign there) might continue in the next chunk, so only accept it once
+        # more input (or EOF) confirms it
+        if not eof and (end == len(buf) or (
+                isinstance(obj, (int, float)) and not isinstance(obj, bool) and
+                all(c in _NUMBER_CHARS for c in buf[end:]))):
+            fill(len(buf) - pos)
+            continue
+
+        pos = end
+        yield obj
+
+class ArrayWriter:
+    """Writes objects as a pretty-printed JSON array, one element at a time."""
+
+    def __init__(self, f, indent=4):
+        self.f = f
+        self.indent = indent
+        self.count = 0
+
+    def write(self, obj):
+        text = json.dumps(obj, indent=self.indent, ensure_ascii=False)
+        pad = " " * self.indent
+        text = pad + text.replace("\n", "\n" + pad)
+        self.f.write(("[\n" if self.count == 0 else ",\n") + text)
+        self.count += 1
+
+    def close(self):
+        self.f.write("\n]" if self.count else "[]")
+
+class JsonLinesWriter:
+    """Writes one compact JSON object per line."""
+
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+
+    def write(self, obj):
+        self.f.write(json.dumps(obj, ensure_ascii=False))
+        self.f.write("\n")
+        self.count += 1
+
+    def close(self):
+        pass
+
+def convert_stream(in_file, out_file, output_format="array", chunk_size=CHUNK_SIZE):
+    """Stream every object from in_file to out_file in the requested format. Returns the object count."""
+    if output_format == "array":
+        writer = ArrayWriter(out_file)
+    elif output_format == "jsonl":
+        writer = JsonLinesWriter(out_file)
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+    for obj in iter_json_objects(in_file, chunk_size=chunk_size):
+        writer.write(obj)
+    writer.close()
+    return writer.count
+
+def fix_json_file(input_filename, output_filename, output_format="array", chunk_size=CHUNK_SIZE):
+    # Write to a temporary file next to the output so a failed conversion
+    # never leaves a half-written file behind
+    out_dir = os.path.dirname(os.path.abspath(output_filename))
+    fd, temp_path = tempfile.mkstemp(prefix=".fix-json-", dir=out_dir)
     try:
-        json_objects = json.loads(fixed_data)
-    except json.JSONDecodeError as e:
+        with open(input_filename, 'r', encoding='utf-8') as f, \
+                os.fdopen(fd, 'w', encoding='utf-8') as out_file:
+            count = convert_stream(f, out_file, output_format, chunk_size)
+        # mkstemp creates the file owner-only; give it the mode open() would have
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        os.replace(temp_path, output_filename)
+    except (json.JSONDecodeError, ValueError) as e:
+        os.remove(temp_path)
         print("Error decoding JSON:", e)
         sys.exit(1)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    print(f"Fixed JSON file ({count} objects) has been written to: {output_filename}")
+    return count
 
-    # Write out the fixed JSON with pretty formatting.
-    with open(output_filename, 'w', encoding='utf-8') as out_file:
-        json.dump(json_objects, out_file, indent=4, ensure_ascii=False)
+def benchmark(input_filename, output_format="array", chunk_size=CHUNK_SIZE, repeat=3):
+    """Report conversion throughput and peak Python heap usage for input_filename."""
+    size = os.path.getsize(input_filename)
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        with open(input_filename, 'r', encoding='utf-8') as f, \
+                open(os.devnull, 'w', encoding='utf-8') as out_file:
+            start = time.perf_counter()
+            count = convert_stream(f, out_file, output_format, chunk_size)
+            best = min(best, time.perf_counter() - start)
 
-    print(f"Fixed JSON file has been written to: {output_filename}")
+    # Measure memory in a separate pass since tracemalloc skews timings
+    tracemalloc.start()
+    with open(input_filename, 'r', encoding='utf-8') as f, \
+            open(os.devnull, 'w', encoding='utf-8') as out_file:
+        convert_stream(f, out_file, output_format, chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mb = size / (1024 * 1024)
+    print(f"Input: {input_filename} ({mb:.2f} MB, {count} objects)")
+    print(f"Output format: {output_format}, chunk size: {chunk_size} chars")
+    print(f"Best of {repeat}: {best:.3f}s ({mb / best:.1f} MB/s, {count / best:.0f} objects/s)")
+    print(f"Peak traced memory: {peak / (1024 * 1024):.2f} MB")
+    return {"seconds": best, "mb_per_s": mb / best, "peak_bytes": peak, "objects": count}
 
 def main():
-    parser = argparse.ArgumentParser(description="Fix a JSON file with multiple top-level objects by wrapping them in an array.")
+    parser = argparse.ArgumentParser(
+        description="Convert between the scraper's JSON formats (concatenated objects, JSON array, JSON Lines) in constant memory."
+    )
     parser.add_argument("input", help="Path to the input JSON file")
-    parser.add_argument("output", help="Path to the output fixed JSON file")
+    parser.add_argument("output", nargs="?", help="Path to the output fixed JSON file")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="array",
+                        help="Output format: a pretty-printed JSON array (default) or JSON Lines")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Characters read per buffer refill")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Measure conversion throughput instead of writing an output file")
     args = parser.parse_args()
 
-    fix_json_file(args.input, args.output)
+    if args.benchmark:
+        benchmark(args.input, args.format, args.chunk_size)
+        return
+    if not args.output:
+        parser.error("the output path is required unless --benchmark is given")
+
+    fix_json_file(args.input, args.output, args.format, args.chunk_size)
 
 if __name__ == '__main__':
     main()
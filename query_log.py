@@ -0,0 +1,267 @@
+import os
+import re
+import json
+import hmac
+import time
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+QUERY_LOG_FILE = "query_log.jsonl"
+QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+QUERY_LOG_BACKUPS = 5
+FLUSH_INTERVAL = 5.0
+BUFFER_SIZE = 100
+QUEUE_SIZE = 10000
+
+# Ranking of hot questions for the answer cache
+RANK_WINDOW_DAYS = 7
+MIN_CLUSTER_COUNT = 3
+TOP_CLUSTERS = 25
+ANSWER_CACHE_TTL = 36 * 3600
+RANKED_OUTCOMES = ("answered", "cache_hit")
+
+# Greetings around a question that don't change what is being asked ("hey orpheus, what is sprig? thanks")
+QUESTION_FILLER = frozenset("hey hi hello yo orpheus please pls thanks thx".split())
+
+USER_MENTION_RE = re.compile(r"<@[A-Z0-9]+(?:\|[^>]*)?>")
+CHANNEL_MENTION_RE = re.compile(r"<#[A-Z0-9]+(?:\|[^>]*)?>")
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+# International numbers written with a leading +, or the usual (555) 123-4567 grouping;
+# bare digit runs and ranges like 2023-2024 are left alone
+PHONE_RE = re.compile(r"\+\d[\d\s().-]{6,}\d|\(?\b\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}\b")
+WORD_RE = re.compile(r"\w+")
+
+# Without a configured salt, identifiers can only be correlated within one process
+_salt = (os.getenv("QUERY_LOG_SALT") or os.urandom(16).hex()).encode("utf-8")
+
+def pseudonymize(value):
+    """Stable, non-reversible stand-in for a Slack user or channel id."""
+    if not value:
+        return None
+    return hmac.new(_salt, value.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+def anonymize_text(text):
+    """Strip mentions and contact details from a question before it is logged."""
+    text = USER_MENTION_RE.sub("<@user>", text)
+    text = CHANNEL_MENTION_RE.sub("<#channel>", text)
+    text = EMAIL_RE.sub("<email>", text)
+    return PHONE_RE.sub("<phone>", text)
+
+def question_key(question):
+    """
+    Normalized form of a question for exact-match caching: lowercased words and
+    numbers in their original order, without greetings at either end. Returns ""
+    for questions with no words and for questions containing mentions or
+    contact details, whose answer depends on who or what they refer to.
+    """
+    if anonymize_text(question) != question:
+        return ""
+    words = WORD_RE.findall(question.lower())
+    while words and words[0] in QUESTION_FILLER:
+        words.pop(0)
+    while words and words[-1] in QUESTION_FILLER:
+        words.pop()
+    return " ".join(words)
+
+class BufferedJsonlWriter:
+    """
+    Appends JSON records to a file from a background thread.
+
+    write() only enqueues, so callers never wait on disk I/O; records are
+    flushed in batches of `buffer_size` or every `flush_interval` seconds.
+    The file is rotated to `path.1` ... `path.<backup_count>` once it grows
+    past `max_bytes`. If the queue is full the record is dropped and counted
+    in `dropped`.
+    """
+
+    def __init__(self, path=QUERY_LOG_FILE, max_bytes=QUERY_LOG_MAX_BYTES, backup_count=QUERY_LOG_BACKUPS,
+                 flush_interval=FLUSH_INTERVAL, buffer_size=BUFFER_SIZE, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, record):
+        """Queue a record for writing. Returns False if it had to be dropped."""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout=None):
+        """
+        Block until everything queued so far has been written. Returns False if
+        that didn't happen within `timeout` or the writer is already closed.
+        """
+        if self._closed or not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=10)
+        except queue.Full:
+            logger.error(f"Query log queue still full on close, {self._queue.qsize()} records lost")
+            return
+        self._thread.join(timeout=10)
+
+    def _run(self):
+        buffer = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+
+            if isinstance(item, dict):
+                buffer.append(item)
+                if len(buffer) < self.buffer_size:
+                    continue
+            if buffer:
+                self._write_lines(buffer)
+                buffer = []
+            deadline = time.monotonic() + self.flush_interval
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _write_lines(self, records):
+        f = None
+        try:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            f = open(self.path, "a", encoding="utf-8")
+            for record in records:
+                line = json.dumps(record, ensure_ascii=False) + "\n"
+                length = len(line.encode("utf-8"))
+                # Checked per record so a single batch can't push the file past
+                # max_bytes; only a record larger than max_bytes on its own can
+                if size and size + length > self.max_bytes:
+                    f.close()
+                    self._rotate()
+                    f = open(self.path, "a", encoding="utf-8")
+                    size = 0
+                f.write(line)
+                size += length
+        except Exception as e:
+            logger.error(f"Error writing query log {self.path}: {e}")
+        finally:
+            if f is not None:
+                f.close()
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+def query_record(user_id, channel_id, question, outcome, latency):
+    return {
+        "ts": time.time(),
+        "user": pseudonymize(user_id),
+        "channel": pseudonymize(channel_id),
+        "question": anonymize_text(question),
+        # Keyed on the raw text, so questions that needed anonymizing get no key
+        "key": question_key(question),
+        "outcome": outcome,
+        "latency_ms": round(latency * 1000, 1),
+    }
+
+def iter_query_log(path=QUERY_LOG_FILE, backup_count=QUERY_LOG_BACKUPS):
+    """Yield records from the current log and its rotated backups, oldest file first."""
+    paths = [f"{path}.{i}" for i in range(backup_count, 0, -1)] + [path]
+    for log_path in paths:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+def rank_question_clusters(records, top_k=TOP_CLUSTERS, min_count=MIN_CLUSTER_COUNT,
+                           window_days=RANK_WINDOW_DAYS, now=None):
+    """
+    Rank questions by how often they were asked within the window, grouped by
+    their normalized key. Returns [(count, key, representative question)], most
+    frequent first; the representative is the most common phrasing.
+    """
+    since = (now or time.time()) - window_days * 86400
+    counts = Counter()
+    phrasings = defaultdict(Counter)
+    for record in records:
+        if record.get("ts", 0) < since or record.get("outcome") not in RANKED_OUTCOMES:
+            continue
+        question = (record.get("question") or "").strip()
+        key = record.get("key")
+        if not key:
+            continue
+        counts[key] += 1
+        phrasings[key][question] += 1
+    return [
+        (count, key, phrasings[key].most_common(1)[0][0])
+        for key, count in counts.most_common(top_k)
+        if count >= min_count
+    ]
+
+class AnswerCache:
+    """
+    Pre-computed answers keyed by normalized question, replaced wholesale on each
+    warm-up. Only a question with exactly the same key is served from the cache.
+    """
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, question):
+        key = question_key(question)
+        if not key:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry[0]
+
+    def replace(self, answers):
+        """Swap in a new {question key: answer} mapping in one step."""
+        expires = time.time() + self.ttl
+        entries = {key: (answer, expires) for key, answer in answers.items()}
+        with self._lock:
+            self._entries = entries
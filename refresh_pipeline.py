@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import logging
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+class Stage:
+    """
+    A named step of the refresh pipeline.
+
+    `func` is called with the results of `deps`, in order. A stage whose
+    dependencies all produced the same content as the last time it succeeded
+    is skipped (and so is everything downstream of it), so uploads only happen
+    when upstream data changed. Stages without dependencies (fetches) always
+    run. A stage fails by raising; stages that depend on it are then blocked.
+
+    With `any_changed`, the stage instead runs when at least one dependency
+    ran, even if others failed, and receives None for dependencies that were
+    unchanged or failed.
+    """
+
+    def __init__(self, name, func, deps=(), any_changed=False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.any_changed = any_changed
+
+def content_digest(value):
+    """Fingerprint a stage result for change detection, or None if it can't be hashed."""
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if isinstance(value, (bytes, bytearray)):
+        return hashlib.sha256(value).hexdigest()
+    return None
+
+class RefreshPipeline:
+    """
+    Runs dependent stages in order and independent stages concurrently.
+
+    Only one run happens at a time: a run started while another is in progress
+    returns immediately. The input digests each stage last succeeded with are
+    kept in `state_file` (when given) so a restart doesn't republish unchanged
+    data, and the per-stage outcome and duration of the latest run are kept in
+    `last_run`.
+    """
+
+    def __init__(self, stages, state_file=None, max_workers=4):
+        # Stages must be listed after their dependencies, which also rules out cycles
+        self.stages = {}
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on {dep}, which is unknown or listed after it")
+            self.stages[stage.name] = stage
+        self.state_file = state_file
+        self.max_workers = max_workers
+        self.last_run = {}
+        self._lock = threading.Lock()
+        self._state = self._load_state()
+
+    def _load_state(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading refresh state {self.state_file}: {e}")
+            return {}
+
+    def _save_state(self):
+        if not self.state_file:
+            return
+        try:
+            temp_path = f"{self.state_file}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, indent=4)
+            os.replace(temp_path, self.state_file)
+        except Exception as e:
+            logger.error(f"Error writing refresh state {self.state_file}: {e}")
+
+    def run(self):
+        """Run the pipeline once. Returns the per-stage report, or None if a run was already in progress."""
+        if not self._lock.acquire(blocking=False):
+            logger.warning("Previous refresh is still running, skipping this one")
+            return None
+        try:
+            return self._run()
+        finally:
+            self._lock.release()
+
+    def _run(self):
+        logger.info("Starting refresh pipeline")
+        started = time.perf_counter()
+        results = {}
+        digests = {}
+        report = {}
+        pending = dict(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if any(dep not in report for dep in stage.deps):
+                        continue
+                    del pending[name]
+
+                    failed = [dep for dep in stage.deps if report[dep]["status"] not in ("ok", "unchanged")]
+                    # An any_changed stage still has to react to the dependencies that did
+                    # run; otherwise their change is never seen once they report unchanged
+                    ran = any(report[dep]["status"] == "ok" for dep in stage.deps)
+                    if failed and not (stage.any_changed and ran):
+                        report[name] = {"status": "blocked", "seconds": 0.0, "blocked_by": failed}
+                        continue
+
+                    # Nothing new reaches a stage downstream of an unchanged one
+                    unchanged = [report[dep]["status"] == "unchanged" for dep in stage.deps]
+                    input_key = self._input_key(stage, digests)
+                    if (((unchanged and all(unchanged)) if stage.any_changed else any(unchanged)) or
+                            (input_key is not None and self._state.get(name) == input_key)):
+                        report[name] = {"status": "unchanged", "seconds": 0.0}
+                        continue
+
+                    args = [results.get(dep) for dep in stage.deps]
+                    running[executor.submit(self._timed, stage.func, args)] = (name, input_key)
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, input_key = running.pop(future)
+                    seconds, result, error = future.result()
+                    if error is not None:
+                        logger.error(f"Refresh stage {name} failed after {seconds:.2f}s: {error}")
+                        report[name] = {"status": "failed", "seconds": seconds, "error": str(error)}
+                        continue
+                    results[name] = result
+                    digests[name] = content_digest(result)
+                    report[name] = {"status": "ok", "seconds": seconds}
+                    if input_key is not None:
+                        self._state[name] = input_key
+                        self._save_state()
+
+        self.last_run = report
+        summary = ", ".join(f"{name}={entry['status']} ({entry['seconds']:.2f}s)" for name, entry in report.items())
+        logger.info(f"Refresh pipeline finished in {time.perf_counter() - started:.2f}s: {summary}")
+        return report
+
+    def _input_key(self, stage, digests):
+        """Combined digest of a stage's inputs, or None if the stage must always run."""
+        if not stage.deps:
+            return None
+        parts = [digests.get(dep) for dep in stage.deps]
+        if any(part is None for part in parts):
+            return None
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _timed(func, args):
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+            return time.perf_counter() - start, result, None
+        except Exception as e:
+            return time.perf_counter() - start, None, e
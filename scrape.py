@@ -4,17 +4,33 @@ import json
 import uuid
 import yaml
 import glob
+from collections import deque
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urldefrag
 import tldextract
 import os
 import socket
+import time
 
 # Configuration
 SHORTLINK_DOMAIN = "hack.af"
 EMBEDDINGS_FILE = "hackclub_embeddings_cron.json"
 MAX_CONCURRENT_REQUESTS = 100
 RATE_LIMIT_DELAY = 0
+# Stop following links once this many pages have been visited
+MAX_PAGES = 5000
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# Connection reuse: cache DNS answers for the whole crawl and keep
+# connections to each host alive between pages
+MAX_REQUESTS_PER_HOST = 8
+DNS_CACHE_TTL = 3600
+KEEPALIVE_TIMEOUT = 30
+
+# Shortlink expansions persist between runs; failures are retried sooner
+SHORTLINK_CACHE_FILE = "shortlink_cache.json"
+SHORTLINK_CACHE_TTL = 7 * 24 * 3600
+SHORTLINK_NEGATIVE_TTL = 3600
 
 # Add a new list to store all the data
 collected_data = []
@@ -22,13 +38,82 @@ collected_data = []
 visited_urls = set()
 allowed_domains = set()
 
-async def expand_shortlink(session, url):
+# short URL -> {"url": final URL or None, "expires": unix time}
+shortlink_cache = {}
+# short URL -> task, so concurrent crawls of the same link share one request
+pending_shortlinks = {}
+
+def load_shortlink_cache(path=SHORTLINK_CACHE_FILE):
+    global shortlink_cache
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        cache = {}
+    except (OSError, ValueError) as e:
+        print(f"Error reading shortlink cache {path}: {e}")
+        cache = {}
+    now = time.time()
+    shortlink_cache = {short: entry for short, entry in cache.items() if entry.get("expires", 0) > now}
+
+def save_shortlink_cache(path=SHORTLINK_CACHE_FILE):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(shortlink_cache, f, indent=4, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def is_shortlink(url):
+    return urlparse(url).netloc == SHORTLINK_DOMAIN
+
+def make_connector(resolver=None):
+    """Connector shared by the whole crawl: pooled keep-alive connections and cached DNS."""
+    return aiohttp.TCPConnector(
+        resolver=resolver,
+        limit=MAX_CONCURRENT_REQUESTS,
+        limit_per_host=MAX_REQUESTS_PER_HOST,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ssl=False
+    )
+
+async def _resolve_shortlink(session, url):
     try:
         async with session.head(url, allow_redirects=True, timeout=10) as response:
-            return str(response.url) if response.status == 200 else None
+            expanded = str(response.url) if response.status == 200 else None
     except Exception as e:
         print(f"Error expanding {url}: {e}")
-        return None
+        expanded = None
+    ttl = SHORTLINK_CACHE_TTL if expanded else SHORTLINK_NEGATIVE_TTL
+    shortlink_cache[url] = {"url": expanded, "expires": time.time() + ttl}
+    return expanded
+
+async def expand_shortlink(session, url):
+    entry = shortlink_cache.get(url)
+    if entry and entry["expires"] > time.time():
+        return entry["url"]
+
+    task = pending_shortlinks.get(url)
+    if task is None:
+        task = asyncio.ensure_future(_resolve_shortlink(session, url))
+        pending_shortlinks[url] = task
+        task.add_done_callback(lambda _: pending_shortlinks.pop(url, None))
+    return await task
+
+async def preresolve_shortlinks(session, urls):
+    """Expand every uncached shortlink in urls concurrently, ahead of crawling them."""
+    now = time.time()
+    todo = {url for url in urls if is_shortlink(url) and not (url in shortlink_cache and shortlink_cache[url]["expires"] > now)}
+    if not todo:
+        return
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def resolve(url):
+        async with semaphore:
+            await expand_shortlink(session, url)
+
+    await asyncio.gather(*(resolve(url) for url in todo))
+    print(f"Pre-resolved {len(todo)} shortlinks")
 
 def get_subdomains_from_yaml(yaml_files):
     subdomains = set()
@@ -51,32 +136,46 @@ def get_subdomains_from_yaml(yaml_files):
                 print(f"Error parsing {yaml_file}: {e}")
     return subdomains
 
-async def extract_data(session, url):
+async def fetch_html(session, url):
     try:
         # Skip SSL verification for misconfigured domains
         async with session.get(url, timeout=10, headers={"User-Agent": "Mozilla/5.0"}, ssl=False) as response:
             if response.status != 200:
                 print(f"Error: {url} returned status code {response.status}")
                 return None
+            # Links lead to PDFs, images and downloads too; only pages are parsed
+            if response.content_type not in HTML_CONTENT_TYPES:
+                return None
+            return await response.text()
+    except Exception as e:
+        print(f"Error scraping {url}: {e}")
+        return None
+
+def parse_page(url, soup):
+    title = soup.title.string.strip() if soup.title else "No Title"
+    headings = [h.get_text(strip=True) for h in soup.find_all(["h1", "h2", "h3"])]
+    paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")]
+    metadata = {meta["name"]: meta["content"] for meta in soup.find_all("meta", attrs={"name": True, "content": True})}
+
+    content = "\n".join(paragraphs)
+    return {
+        "id": str(uuid.uuid4()),
+        "url": url,
+        "title": title,
+        "content": content,
+        "metadata": {
+            "headings": headings,
+            "keywords": metadata.get("keywords", "").split(", ")
+        }
+    }
 
-            html = await response.text()
-            soup = BeautifulSoup(html, "lxml")  # Use lxml for faster parsing
-            title = soup.title.string.strip() if soup.title else "No Title"
-            headings = [h.get_text(strip=True) for h in soup.find_all(["h1", "h2", "h3"])]
-            paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")]
-            metadata = {meta["name"]: meta["content"] for meta in soup.find_all("meta", attrs={"name": True, "content": True})}
-
-            content = "\n".join(paragraphs)
-            return {
-                "id": str(uuid.uuid4()),
-                "url": url,
-                "title": title,
-                "content": content,
-                "metadata": {
-                    "headings": headings,
-                    "keywords": metadata.get("keywords", "").split(", ")
-                }
-            }
+async def extract_data(session, url):
+    html = await fetch_html(session, url)
+    if html is None:
+        return None
+    try:
+        soup = BeautifulSoup(html, "lxml")  # Use lxml for faster parsing
+        return parse_page(url, soup)
     except Exception as e:
         print(f"Error scraping {url}: {e}")
         return None
@@ -88,28 +187,35 @@ async def crawl_url(session, url, discovered_links):
 
     print(f"Crawling: {url}")
     
-    parsed_url = urlparse(url)
-    if parsed_url.netloc == SHORTLINK_DOMAIN:
+    if is_shortlink(url):
         expanded_url = await expand_shortlink(session, url)
-        if expanded_url and expanded_url not in visited_urls:
+        if expanded_url:
+            # Shortlinks often point at pages the crawl reaches directly as well
+            if expanded_url in visited_urls:
+                return
+            visited_urls.add(expanded_url)
             url = expanded_url
             print(f"Expanded shortlink: {url}")
 
-    data = await extract_data(session, url)
-    if not data:
+    # Fetch each page once and use the same parse for its data and its links
+    html = await fetch_html(session, url)
+    if html is None:
+        return
+    try:
+        soup = BeautifulSoup(html, "lxml")
+        data = parse_page(url, soup)
+    except Exception as e:
+        print(f"Error scraping {url}: {e}")
         return
 
     # Instead of writing directly to file, append to our list
     collected_data.append(data)
 
     try:
-        async with session.get(url, timeout=10, ssl=False) as response:
-            html = await response.text()
-            soup = BeautifulSoup(html, "lxml")
-            for link in soup.find_all("a", href=True):
-                full_link = urljoin(url, link["href"])
-                if is_valid_link(full_link):
-                    discovered_links.add(full_link)
+        for link in soup.find_all("a", href=True):
+            full_link = urldefrag(urljoin(url, link["href"])).url
+            if is_valid_link(full_link):
+                discovered_links.add(full_link)
     except Exception as e:
         print(f"Error processing links for {url}: {e}")
 
@@ -119,8 +225,33 @@ def is_valid_link(link):
     return parsed.scheme in ["http", "https"] and domain in allowed_domains and link not in visited_urls
 
 async def process_batch(session, batch):
-    tasks = [crawl_url(session, url, set()) for url in batch]
+    """Crawl a batch of URLs concurrently. Returns the links found on their pages."""
+    discovered_links = set()
+    tasks = [crawl_url(session, url, discovered_links) for url in batch]
     await asyncio.gather(*tasks)
+    return discovered_links
+
+async def crawl(session, start_urls, max_pages=MAX_PAGES):
+    """
+    Crawl breadth-first from start_urls, following links within allowed_domains
+    until no new links turn up or max_pages pages have been visited. Shortlinks
+    found in a batch are expanded together before they are crawled, so repeat
+    links come from the cache and new ones share pooled connections.
+    """
+    queue = deque(start_urls)
+    queued = set(queue)
+    await preresolve_shortlinks(session, queue)
+    while queue and len(visited_urls) < max_pages:
+        size = min(MAX_CONCURRENT_REQUESTS, len(queue), max_pages - len(visited_urls))
+        batch = [queue.popleft() for _ in range(size)]
+        discovered_links = await process_batch(session, batch)
+        new_links = [link for link in discovered_links if link not in queued and link not in visited_urls]
+        queued.update(new_links)
+        await preresolve_shortlinks(session, new_links)
+        queue.extend(new_links)
+        await asyncio.sleep(RATE_LIMIT_DELAY)
+    if queue:
+        print(f"Stopped after {len(visited_urls)} pages with {len(queue)} links left to crawl")
 
 async def main():
     global allowed_domains
@@ -137,12 +268,10 @@ async def main():
     valid_urls = [url for url in discovered_links if is_valid_link(url)]
     print(f"Valid URLs to crawl: {len(valid_urls)}")
 
-    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_REQUESTS, ssl=False)
-    async with aiohttp.ClientSession(connector=connector) as session:
-        while valid_urls:
-            batch = [valid_urls.pop() for _ in range(min(MAX_CONCURRENT_REQUESTS, len(valid_urls)))]
-            await process_batch(session, batch)
-            await asyncio.sleep(RATE_LIMIT_DELAY)
+    load_shortlink_cache()
+    async with aiohttp.ClientSession(connector=make_connector()) as session:
+        await crawl(session, valid_urls)
+    save_shortlink_cache()
 
     # Write all collected data at once in proper JSON format
     with open(EMBEDDINGS_FILE, 'w', encoding='utf-8') as f:
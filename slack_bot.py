@@ -1,12 +1,17 @@
 import os
+import json
 import logging
 import yaml
 import requests
 import tempfile
 import time
 import re
+import threading
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
+from refresh_pipeline import RefreshPipeline, Stage
+import bm25_index
+import query_log
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 from pinecone import Pinecone
@@ -37,6 +42,20 @@ YAML_URL = "https://raw.githubusercontent.com/hackclub/YSWS-Catalog/main/data.ym
 # New constant for embeddings URL
 EMBEDDINGS_URL = "https://raw.githubusercontent.com/DevSrijit/orpheus-chat/refs/heads/main/hackclub_embeddings_cron.json"
 
+# Refresh pipeline: poll for upstream changes and only republish what changed
+REFRESH_INTERVAL_MINUTES = 60
+REFRESH_STATE_FILE = "refresh_state.json"
+
+# Keyword search hints added to questions that name specific programs or events.
+# Off unless KEYWORD_HINTS_ENABLED=1, since they change what the assistant is asked.
+KEYWORD_HINTS_ENABLED = os.getenv("KEYWORD_HINTS_ENABLED") == "1"
+KEYWORD_HINTS = 3
+KEYWORD_MIN_SCORE = 1.0
+KEYWORD_TITLE_MAX_CHARS = 80
+
+# Query log and answer cache for frequently asked questions
+PREWARM_HOUR = 3
+
 # Constants for user context scraping
 CONTEXT_CHANNEL_ID = "C05B6DBN802"
 CONTEXT_USER_ID = "U07BU2HS17Z"
@@ -131,12 +150,18 @@ def yaml_to_pdf(yaml_data, output_path):
     # Build the PDF
     doc.build(story)
 
-def fetch_yaml_data():
-    """Fetch YAML data from GitHub and convert to PDF"""
+def fetch_yaml_source():
+    """Fetch the raw YSWS catalog YAML from GitHub"""
+    response = requests.get(YAML_URL, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+def fetch_yaml_data(content=None):
+    """Fetch YAML data from GitHub (unless already fetched) and convert to PDF"""
     try:
-        response = requests.get(YAML_URL)
-        response.raise_for_status()
-        yaml_data = yaml.safe_load(response.content)
+        if content is None:
+            content = fetch_yaml_source()
+        yaml_data = yaml.safe_load(content)
         
         # Create temporary PDF file
         pdf_path = tempfile.mktemp(prefix='ysws-data-', suffix='.pdf')
@@ -177,14 +202,14 @@ def wait_for_file_processing(file_id, timeout=5000, interval=10):
     logger.error("File processing timed out")
     return False
 
-def update_knowledge_base():
-    """Update Pinecone knowledge base with PDF document"""
+def update_knowledge_base(content=None):
+    """Update Pinecone knowledge base with PDF document. Returns True on success."""
     logger.info("Starting knowledge base update")
     
-    data = fetch_yaml_data()
+    data = fetch_yaml_data(content)
     if not data:
         logger.error("Failed to fetch and process YAML data")
-        return
+        return False
 
     # Delete previous files
     try:
@@ -217,9 +242,11 @@ def update_knowledge_base():
             logger.info("New file successfully processed and available")
         else:
             raise Exception("File processing failed")
+        return True
             
     except Exception as e:
         logger.error(f"Knowledge base update failed: {e}")
+        return False
     finally:
         # Clean up temporary PDF file
         try:
@@ -227,19 +254,26 @@ def update_knowledge_base():
         except Exception as e:
             logger.error(f"Error cleaning up temporary file: {e}")
 
-def update_embeddings():
-    """Update Pinecone knowledge base with embeddings data"""
+def fetch_embeddings_source():
+    """Fetch the scraped embeddings JSON produced by the daily CI scrape"""
+    response = requests.get(EMBEDDINGS_URL, timeout=60)
+    response.raise_for_status()
+    return response.content
+
+def update_embeddings(content=None):
+    """Update Pinecone knowledge base with embeddings data. Returns True on success."""
     logger.info("Starting embeddings update")
+    temp_path = None
     
     try:
-        # Fetch new embeddings file
-        response = requests.get(EMBEDDINGS_URL)
-        response.raise_for_status()
+        # Fetch new embeddings file unless the caller already has it
+        if content is None:
+            content = fetch_embeddings_source()
         
         # Create temporary file for embeddings data
         temp_path = tempfile.mktemp(prefix='embeddings-', suffix='.json')
         with open(temp_path, 'wb') as f:
-            f.write(response.content)
+            f.write(content)
         
         # Delete previous embeddings file(s)
         try:
@@ -276,15 +310,18 @@ def update_embeddings():
             logger.info("New embeddings file successfully processed and available")
         else:
             raise Exception("Embeddings file processing failed")
+        return True
             
     except Exception as e:
         logger.error(f"Embeddings update failed: {e}")
+        return False
     finally:
         # Clean up temporary embeddings file
-        try:
-            os.remove(temp_path)
-        except Exception as e:
-            logger.error(f"Error cleaning up temporary embeddings file: {e}")
+        if temp_path is not None:
+            try:
+                os.remove(temp_path)
+            except Exception as e:
+                logger.error(f"Error cleaning up temporary embeddings file: {e}")
 
 def update_user_context(message_text):
     """
@@ -382,14 +419,152 @@ def sanitize_mentions(text):
     text = re.sub(r"@((?:channel|here|everyone)[^>]*)", r"@/\1", text)
     return text
 
-# Scheduler for periodic updates
+def publish_knowledge_base(content):
+    """Refresh stage: upload the YSWS catalog PDF built from freshly fetched YAML"""
+    if not update_knowledge_base(content):
+        raise Exception("Knowledge base publish failed")
+
+def publish_embeddings(content):
+    """Refresh stage: upload the freshly fetched embeddings file"""
+    if not update_embeddings(content):
+        raise Exception("Embeddings publish failed")
+
+def load_keyword_index():
+    """Load the BM25 keyword index from disk, or None if it hasn't been built yet"""
+    if not os.path.exists(bm25_index.INDEX_FILE):
+        return None
+    try:
+        return bm25_index.BM25Index.load(bm25_index.INDEX_FILE)
+    except Exception as e:
+        logger.error(f"Error loading keyword index: {e}")
+        return None
+
+keyword_index = load_keyword_index()
+
+def update_keyword_index(content):
+    """Refresh stage: bring the local BM25 keyword index in line with the new scrape"""
+    global keyword_index
+    index = load_keyword_index() or bm25_index.BM25Index()
+    stats = index.update(json.loads(content))
+    index.save(bm25_index.INDEX_FILE)
+    # Swap in the new index in one assignment so handlers never see a partial update
+    keyword_index = index
+    logger.info(f"Keyword index updated: {stats}")
+
+def keyword_hint_pages(question):
+    """
+    Pages from the BM25 keyword index named after something in the question,
+    as "- title: url" lines, or "" if there are none. Titles come from arbitrary
+    scraped sites, so they are flattened to one short line and the whole list
+    is run through Lakera moderation before it can reach the assistant.
+    """
+    index = keyword_index
+    if index is None:
+        return ""
+    # Only pages named after something in the question, so a rare word like
+    # "hi" doesn't pull in a page that merely mentions it
+    terms = set(bm25_index.tokenize(question))
+    lines = []
+    for score, doc in index.search(question, top_k=KEYWORD_HINTS):
+        title = " ".join((doc.get("title") or "").split())[:KEYWORD_TITLE_MAX_CHARS]
+        url = doc.get("url") or ""
+        if score < KEYWORD_MIN_SCORE or not terms & set(bm25_index.tokenize(f"{title} {url}")):
+            continue
+        title = title.replace("<", "").replace(">", "").replace("`", "")
+        lines.append(f"- {title}: {url}" if title else f"- {url}")
+    if not lines:
+        return ""
+    pages = "\n".join(lines)
+    flagged, _ = moderate_with_lakera(pages)
+    if flagged:
+        logger.warning("Keyword hint pages were flagged by moderation, leaving them out")
+        return ""
+    return pages
+
+def ask_assistant(question):
+    """
+    Ask the Pinecone assistant a question and return its sanitized answer.
+    With KEYWORD_HINTS_ENABLED, pages that match the question's exact keywords
+    (program and event names, domains) are listed alongside it.
+    """
+    content = question
+    if KEYWORD_HINTS_ENABLED:
+        pages = keyword_hint_pages(question)
+        if pages:
+            content = f"{question}\n\nPossibly relevant Hack Club pages (keyword search):\n{pages}"
+    response = assistant.chat(messages=[Message(content=content)])
+    return sanitize_mentions(response["message"]["content"])
+
+# Anonymized questions, latencies and outcomes, written off the request path
+query_logger = query_log.BufferedJsonlWriter(query_log.QUERY_LOG_FILE)
+answer_cache = query_log.AnswerCache()
+prewarm_lock = threading.Lock()
+prewarm_requested = threading.Event()
+
+def log_query(event, question, outcome, started):
+    query_logger.write(query_log.query_record(
+        event.get("user"), event.get("channel"), question, outcome, time.perf_counter() - started
+    ))
+
+def prewarm_answer_cache(*_):
+    """
+    Answer the most frequently asked questions ahead of time. A request that
+    arrives while a warm-up is running makes it run once more when it finishes,
+    so answers built before newly published data are always replaced.
+    """
+    prewarm_requested.set()
+    while prewarm_lock.acquire(blocking=False):
+        try:
+            while prewarm_requested.is_set():
+                prewarm_requested.clear()
+                warm_answer_cache()
+        finally:
+            prewarm_lock.release()
+        # A request may have come in after the last pass but before the release
+        if not prewarm_requested.is_set():
+            return
+    logger.info("Answer cache warm-up already running, it will run again when done")
+
+def warm_answer_cache():
+    if not query_logger.flush(timeout=30):
+        logger.warning("Query log writer is busy or closed, ranking the questions already on disk")
+    records = query_log.iter_query_log(query_logger.path, query_logger.backup_count)
+    clusters = query_log.rank_question_clusters(records)
+    logger.info(f"Warming answer cache for {len(clusters)} frequent questions")
+    answers = {}
+    for count, key, question in clusters:
+        try:
+            answers[key] = ask_assistant(question)
+        except Exception as e:
+            logger.error(f"Error pre-computing answer for '{key}': {e}")
+    answer_cache.replace(answers)
+    logger.info(f"Answer cache warmed with {len(answers)} answers")
+
+# Fetches run every time; each publish stage only runs when its upstream
+# content changed since it last succeeded, and independent branches run concurrently
+refresh_pipeline = RefreshPipeline([
+    Stage("fetch_yaml", fetch_yaml_source),
+    Stage("fetch_embeddings", fetch_embeddings_source),
+    Stage("publish_knowledge_base", publish_knowledge_base, deps=["fetch_yaml"]),
+    Stage("publish_embeddings", publish_embeddings, deps=["fetch_embeddings"]),
+    Stage("keyword_index", update_keyword_index, deps=["fetch_embeddings"]),
+    # The keyword index only affects answers when hints are enabled
+    Stage("prewarm_answers", prewarm_answer_cache,
+          deps=["publish_knowledge_base", "publish_embeddings"] + (["keyword_index"] if KEYWORD_HINTS_ENABLED else []),
+          any_changed=True),
+], state_file=REFRESH_STATE_FILE)
+
+# Scheduler for periodic updates. Polling picks up the CI scrape soon after it
+# lands instead of at a fixed offset; the pipeline itself also refuses to overlap.
 scheduler = BackgroundScheduler()
-scheduler.add_job(update_knowledge_base, 'cron', hour=0)
-scheduler.add_job(update_embeddings, 'cron', hour=0, minute=30)
+scheduler.add_job(refresh_pipeline.run, 'interval', minutes=REFRESH_INTERVAL_MINUTES,
+                  max_instances=1, coalesce=True)
+scheduler.add_job(prewarm_answer_cache, 'cron', hour=PREWARM_HOUR, max_instances=1, coalesce=True)
 scheduler.start()
 
 @app.event("app_mention")
 def handle_app_mention_events(body, say):
+    started = time.perf_counter()
     event = body.get("event", {})
     channel_id = event.get("channel")
     message_ts = event.get("ts")
@@ -421,6 +596,7 @@ def handle_app_mention_events(body, say):
                 }
             ]
         })
+        log_query(event, text, "flagged", started)
         return
 
     # FD Moderation: Restrict processing in lounge channel
@@ -442,21 +618,25 @@ def handle_app_mention_events(body, say):
                 }
             ]
         })
+        log_query(event, text, "lounge", started)
         return
 
     # Normal stuff
+    outcome = "error"
     try:
         try:
             app.client.reactions_add(channel=channel_id, timestamp=message_ts, name="loading-dots")
         except Exception as e:
             logger.error(f"Failed to add loading reaction: {e}")
         
-        msg = Message(content=text)
-        response = assistant.chat(messages=[msg])
-        
-        # Format the message content for Slack and sanitize mentions
-        message_content = response["message"]["content"]
-        message_content = sanitize_mentions(message_content)
+        # Frequently asked questions are answered ahead of time after each refresh
+        message_content = answer_cache.get(text)
+        if message_content is not None:
+            outcome = "cache_hit"
+        else:
+            # Format the message content for Slack and sanitize mentions
+            message_content = ask_assistant(text)
+            outcome = "answered"
         
         # Send message with proper Slack markdown formatting
         say({
@@ -502,6 +682,7 @@ def handle_app_mention_events(body, say):
             app.client.reactions_remove(channel=channel_id, timestamp=message_ts, name="loading-dots")
         except Exception as e:
             logger.error(f"Failed to remove loading reaction: {e}")
+        log_query(event, text, outcome, started)
 
 # New event handler to capture messages from a specific user in a specific channel
 @app.event("message")
@@ -518,7 +699,9 @@ def handle_user_context_messages(event, logger):
 
 if __name__ == "__main__":
     logger.info("Starting application with scheduled updates")
-    update_knowledge_base()
-    update_embeddings()
+    report = refresh_pipeline.run()
+    # Nothing was republished, so warm the answer cache without waiting for tonight
+    if not report or report.get("prewarm_answers", {}).get("status") != "ok":
+        scheduler.add_job(prewarm_answer_cache)
     handler = SocketModeHandler(app, SLACK_APP_TOKEN)
     handler.start()
\ No newline at end of file